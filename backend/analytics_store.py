@@ -0,0 +1,226 @@
+"""
+Columnar in-memory copy of the crime report fields used for analytics.
+
+Area and crime type are dictionary-encoded into int32 code arrays and
+timestamps are kept as int64 epoch seconds, so aggregations over millions of
+reports are NumPy operations instead of Mongo scans. The store can be
+snapshotted to .npy files and reopened memory-mapped.
+
+A store only sees its own process's inserts, so a snapshot directory belongs
+to exactly one process; ``lock_snapshot_directory`` enforces that.
+"""
+
+import fcntl
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+COLUMNS = ("area_codes", "type_codes", "timestamps")
+
+
+def _epoch_seconds(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((timestamp - EPOCH).total_seconds())
+
+
+def lock_snapshot_directory(directory: str):
+    """Take an exclusive lock on a snapshot directory for this process.
+
+    Returns the open lock file, which holds the lock until it is closed.
+    Raises RuntimeError if another process already owns the directory.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    handle = open(path / ".lock", "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise RuntimeError(f"Analytics snapshot directory {directory} is in use by another process")
+    return handle
+
+
+class _Dictionary:
+    """Maps strings to dense integer codes"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self.codes: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, substring: str) -> np.ndarray:
+        """Codes whose value contains ``substring``, ignoring case.
+
+        Request input is matched as plain text rather than compiled as a regex,
+        so a pathological pattern cannot stall the event loop.
+        """
+        needle = substring.casefold()
+        return np.array([code for code, value in enumerate(self.values) if needle in value.casefold()],
+                        dtype=np.int32)
+
+
+class ColumnarReportStore:
+    """Append-only columnar store of (area, crime type, timestamp) per report.
+
+    Columns grow by doubling, so appends are amortized O(1). Columns loaded
+    memory-mapped are only copied into memory on the first append.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.areas = _Dictionary()
+        self.crime_types = _Dictionary()
+        self.size = 0
+        self.watermark: Optional[datetime] = None
+        self.area_codes = np.empty(initial_capacity, dtype=np.int32)
+        self.type_codes = np.empty(initial_capacity, dtype=np.int32)
+        self.timestamps = np.empty(initial_capacity, dtype=np.int64)
+
+    def _reserve(self, count: int):
+        needed = self.size + count
+        capacity = len(self.timestamps)
+        if needed <= capacity:
+            return
+        capacity = max(capacity * 2, needed, 1024)
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append(self, report: Dict[str, Any]):
+        self.extend([report])
+
+    def extend(self, reports: Iterable[Dict[str, Any]]):
+        reports = list(reports)
+        if not reports:
+            return
+        self._reserve(len(reports))
+        start, end = self.size, self.size + len(reports)
+        self.area_codes[start:end] = [self.areas.encode(report.get("area") or "") for report in reports]
+        self.type_codes[start:end] = [self.crime_types.encode(report.get("crime_type") or "") for report in reports]
+        self.timestamps[start:end] = [_epoch_seconds(report["timestamp"]) for report in reports]
+        self.size = end
+
+        latest = max(report["timestamp"] for report in reports)
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+
+    def _select(self, area: Optional[str]) -> np.ndarray:
+        """Row mask for reports whose area contains ``area`` (all rows when None)"""
+        area_codes = self.area_codes[:self.size]
+        if not area:
+            return np.ones(self.size, dtype=bool)
+        return np.isin(area_codes, self.areas.matching(area))
+
+    def summarize(self, area: Optional[str] = None, now: Optional[datetime] = None,
+                  top_n: int = 10) -> Dict[str, Any]:
+        """Counts, time-of-day patterns and a one-week forecast for the matching reports"""
+        mask = self._select(area)
+        area_codes = self.area_codes[:self.size][mask]
+        type_codes = self.type_codes[:self.size][mask]
+        timestamps = self.timestamps[:self.size][mask]
+        now_seconds = _epoch_seconds(now or datetime.utcnow())
+
+        def ranked(codes: np.ndarray, dictionary: _Dictionary, key: str) -> List[Dict[str, Any]]:
+            counts = np.bincount(codes, minlength=len(dictionary.values))
+            order = np.argsort(counts, kind="stable")[::-1][:top_n]
+            return [{key: dictionary.values[code], "count": int(counts[code])} for code in order if counts[code]]
+
+        hours = np.bincount((timestamps // 3600) % 24, minlength=24)
+        # 1970-01-01 was a Thursday
+        weekdays = np.bincount((timestamps // 86400 + 3) % 7, minlength=7)
+
+        # Daily counts over the last four weeks, newest last
+        days_ago = (now_seconds - timestamps) // 86400
+        recent = days_ago[(days_ago >= 0) & (days_ago < 28)]
+        daily = np.bincount(27 - recent, minlength=28).astype(np.float64)
+        level = daily[0]
+        for count in daily[1:]:
+            level += 0.3 * (count - level)
+
+        last_week = int(daily[-7:].sum())
+        previous_week = int(daily[-14:-7].sum())
+        total = int(mask.sum())
+        return {
+            "area": area,
+            "total_reports": total,
+            "by_type": ranked(type_codes, self.crime_types, "type"),
+            "by_area": ranked(area_codes, self.areas, "area"),
+            "by_hour": hours.tolist(),
+            "peak_hours": [int(hour) for hour in np.argsort(hours, kind="stable")[::-1][:3] if hours[hour]],
+            "by_weekday": dict(zip(WEEKDAYS, weekdays.tolist())),
+            "last_7_days": last_week,
+            "previous_7_days": previous_week,
+            "weekly_change_pct": round(100.0 * (last_week - previous_week) / previous_week, 1) if previous_week else None,
+            "forecast_next_7_days": round(7 * float(level), 1) if total else 0.0,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent view of the store that can be written from another thread"""
+        return {
+            "columns": {name: getattr(self, name)[:self.size] for name in COLUMNS},
+            "areas": list(self.areas.values),
+            "crime_types": list(self.crime_types.values),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+
+    @staticmethod
+    def write_snapshot(directory: str, snapshot: Dict[str, Any]):
+        """Write a snapshot as .npy columns plus a JSON file of dictionaries"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        suffix = f"{os.getpid()}.tmp"
+        for name, column in snapshot["columns"].items():
+            tmp = path / f"{name}.{suffix}.npy"
+            np.save(tmp, column)
+            os.replace(tmp, path / f"{name}.npy")
+        meta = {key: snapshot[key] for key in ("areas", "crime_types", "watermark")}
+        meta["size"] = len(snapshot["columns"]["timestamps"])
+        tmp = path / f"dictionaries.{suffix}.json"
+        tmp.write_text(json.dumps(meta))
+        # Written last so a partial snapshot is never picked up with a newer size
+        os.replace(tmp, path / "dictionaries.json")
+
+    def save(self, directory: str):
+        self.write_snapshot(directory, self.snapshot())
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["ColumnarReportStore"]:
+        """Open a snapshot written by ``save``, or return None if there is none.
+
+        Raises ValueError (or the underlying JSON/NumPy error) if the snapshot
+        is incomplete or inconsistent.
+        """
+        path = Path(directory)
+        if not (path / "dictionaries.json").exists():
+            return None
+        meta = json.loads((path / "dictionaries.json").read_text())
+        store = cls()
+        store.areas = _Dictionary(meta["areas"])
+        store.crime_types = _Dictionary(meta["crime_types"])
+        store.size = meta["size"]
+        store.watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+        for name in COLUMNS:
+            column = np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+            expected = getattr(store, name).dtype
+            if column.ndim != 1 or column.dtype != expected or len(column) < store.size:
+                raise ValueError(f"Snapshot column {name} does not match dictionaries.json")
+            setattr(store, name, column[:store.size])
+
+        for codes, dictionary in ((store.area_codes, store.areas), (store.type_codes, store.crime_types)):
+            if store.size and (codes.min() < 0 or codes.max() >= len(dictionary.values)):
+                raise ValueError("Snapshot codes fall outside its dictionaries")
+        return store
@@ -0,0 +1,129 @@
+"""
+Incremental anomaly detection on the crime report stream.
+
+Reports are counted per (area, crime type) in fixed time buckets (an hour by
+default). When a bucket closes its count is folded into an EWMA baseline and a
+per-time-of-day seasonal expectation, so each report costs O(1) work. A bucket
+whose running count is far above what the baseline expects raises an alert.
+"""
+
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(timestamp: datetime) -> float:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH).total_seconds()
+
+
+class _Baseline:
+    """Streaming state for one (area, crime type) pair"""
+
+    __slots__ = ("bucket", "count", "alerted", "mean", "var", "seasonal", "buckets_seen")
+
+    def __init__(self, bucket: int, slots: int):
+        self.bucket = bucket
+        self.count = 0
+        self.alerted = False
+        self.mean = 0.0
+        self.var = 0.0
+        self.seasonal = [0.0] * slots
+        self.buckets_seen = 0
+
+
+class StreamingAnomalyDetector:
+    """Flags (area, crime type) buckets whose count spikes above the baseline.
+
+    ``alpha`` weights the EWMA baseline and ``seasonal_alpha`` the
+    per-time-of-day expectation. A bucket alerts once its count reaches
+    ``min_count`` and sits ``z_threshold`` deviations above the expectation.
+    Reports older than the current bucket of their pair are ignored.
+    """
+
+    def __init__(self, bucket_seconds: int = 3600, alpha: float = 0.1, seasonal_alpha: float = 0.2,
+                 z_threshold: float = 3.0, min_count: int = 5, max_gap_updates: int = 168):
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.seasonal_alpha = seasonal_alpha
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        # Empty buckets folded in when a pair goes quiet; bounds the cost of a long gap
+        self.max_gap_updates = max_gap_updates
+        self.slots = max(1, 86400 // bucket_seconds)
+        self.baselines: Dict[Tuple[str, str], _Baseline] = {}
+
+    def observe(self, report: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Count one report and return an alert if its bucket is anomalous"""
+        key = (report.get("area") or "", report.get("crime_type") or "")
+        bucket = int(_epoch_seconds(report["timestamp"]) // self.bucket_seconds)
+
+        state = self.baselines.get(key)
+        if state is None:
+            state = self.baselines[key] = _Baseline(bucket, self.slots)
+        elif bucket > state.bucket:
+            self._advance(state, bucket)
+        elif bucket < state.bucket:
+            return None
+
+        state.count += 1
+        if state.alerted or state.count < self.min_count:
+            return None
+
+        expected = self._expected(state, bucket)
+        score = (state.count - expected) / math.sqrt(max(state.var, expected, 1.0))
+        if score < self.z_threshold:
+            return None
+
+        state.alerted = True
+        window_start = EPOCH + timedelta(seconds=bucket * self.bucket_seconds)
+        return {
+            "id": str(uuid.uuid4()),
+            "area": key[0],
+            "crime_type": key[1],
+            "window_start": window_start,
+            "window_end": window_start + timedelta(seconds=self.bucket_seconds),
+            "count": state.count,
+            "expected": round(expected, 2),
+            "score": round(score, 2),
+            "timestamp": datetime.utcnow(),
+        }
+
+    def release(self, alert: Dict[str, Any]):
+        """Let an alert's bucket alert again, e.g. after the alert failed to save"""
+        state = self.baselines.get((alert["area"], alert["crime_type"]))
+        bucket = int(_epoch_seconds(alert["window_start"]) // self.bucket_seconds)
+        if state is not None and state.bucket == bucket:
+            state.alerted = False
+
+    def _expected(self, state: _Baseline, bucket: int) -> float:
+        # Until a full day has been seen the seasonal slots are mostly empty
+        if state.buckets_seen < self.slots:
+            return state.mean
+        return max(state.mean, state.seasonal[bucket % self.slots])
+
+    def _advance(self, state: _Baseline, bucket: int):
+        """Close the current bucket and any empty ones up to ``bucket``"""
+        self._update(state, state.count, state.bucket)
+        gap = min(bucket - state.bucket - 1, self.max_gap_updates)
+        for offset in range(1, gap + 1):
+            self._update(state, 0, state.bucket + offset)
+        state.bucket = bucket
+        state.count = 0
+        state.alerted = False
+
+    def _update(self, state: _Baseline, count: int, bucket: int):
+        diff = count - state.mean
+        state.mean += self.alpha * diff
+        state.var = (1 - self.alpha) * (state.var + self.alpha * diff * diff)
+
+        slot = bucket % self.slots
+        if state.buckets_seen < self.slots:
+            state.seasonal[slot] = float(count)
+        else:
+            state.seasonal[slot] += self.seasonal_alpha * (count - state.seasonal[slot])
+        state.buckets_seen += 1
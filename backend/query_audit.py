@@ -0,0 +1,359 @@
+"""
+Query plan auditing for the Crime Portal API.
+
+When enabled, every query issued by the API (or a random sample of them) is
+re-run through MongoDB's ``explain`` command and the winning plan is checked
+for collection scans, in-memory sorts and poor docs-examined/returned ratios.
+Findings are logged and kept in memory for the admin endpoint.
+
+Run this module directly to report each endpoint's plan against a seeded
+dataset:
+
+    python query_audit.py --reports 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ratio of documents examined to documents returned above which a query is flagged
+DEFAULT_RATIO_THRESHOLD = 10.0
+# Number of recent findings kept for the admin endpoint
+DEFAULT_HISTORY_SIZE = 200
+
+
+# Plan stages that sort documents in memory rather than reading an index in order
+IN_MEMORY_SORT_STAGES = {"SORT", "$sort"}
+
+
+def _walk_stages(node: Any, stages: List[str]):
+    """Collect plan stage names from a winning plan in data-flow order, inputs first"""
+    if isinstance(node, dict):
+        for key in ("queryPlan", "inputStage", "inputStages", "outerStage", "innerStage"):
+            if key in node:
+                _walk_stages(node[key], stages)
+        stage = node.get("stage")
+        if isinstance(stage, str):
+            stages.append(stage)
+    elif isinstance(node, list):
+        for item in node:
+            _walk_stages(item, stages)
+
+
+def _cursor_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of an explain document that describes the query layer.
+
+    Find explains and aggregations pushed down entirely into the query layer
+    carry it at the top level; other aggregations nest it in a leading
+    ``$cursor`` pipeline stage.
+    """
+    stages = explain.get("stages")
+    if isinstance(stages, list) and stages and "$cursor" in stages[0]:
+        return stages[0]["$cursor"]
+    return explain
+
+
+def analyze_plan(explain: Dict[str, Any], ratio_threshold: float = DEFAULT_RATIO_THRESHOLD) -> Dict[str, Any]:
+    """Summarize an explain document and list the problems it shows"""
+    cursor = _cursor_explain(explain)
+    stats = cursor.get("executionStats") or {}
+
+    stages: List[str] = []
+    winning_plan = cursor.get("queryPlanner", {}).get("winningPlan")
+    _walk_stages(winning_plan if winning_plan is not None else stats.get("executionStages"), stages)
+
+    # Aggregation stages run after the query layer, in pipeline order
+    n_returned = int(stats.get("nReturned", 0))
+    pipeline = explain.get("stages") if cursor is not explain else None
+    for stage in (pipeline or [])[1:]:
+        name = next((key for key in stage if key.startswith("$")), None)
+        if name:
+            stages.append(name)
+        if "nReturned" in stage:
+            n_returned = int(stage["nReturned"])
+
+    docs_examined = int(stats.get("totalDocsExamined", 0))
+    keys_examined = int(stats.get("totalKeysExamined", 0))
+    ratio = docs_examined / max(n_returned, 1)
+
+    issues = []
+    if "COLLSCAN" in stages:
+        issues.append("COLLSCAN")
+    if IN_MEMORY_SORT_STAGES.intersection(stages):
+        issues.append("IN_MEMORY_SORT")
+    if docs_examined and ratio > ratio_threshold:
+        issues.append("HIGH_EXAMINED_RATIO")
+
+    return {
+        "stages": stages,
+        "docs_examined": docs_examined,
+        "keys_examined": keys_examined,
+        "n_returned": n_returned,
+        "examined_ratio": round(ratio, 2),
+        "issues": issues,
+    }
+
+
+def build_explain_command(collection: str, kind: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the explain command for a find, aggregate or count issued by the API"""
+    if kind == "find":
+        command: Dict[str, Any] = {"find": collection, "filter": spec.get("filter", {})}
+        if spec.get("sort"):
+            command["sort"] = dict(spec["sort"])
+        if spec.get("limit"):
+            command["limit"] = spec["limit"]
+    elif kind == "aggregate":
+        command = {"aggregate": collection, "pipeline": spec["pipeline"], "cursor": {}}
+    elif kind == "count":
+        # count_documents() is implemented by the driver as this aggregation
+        command = {
+            "aggregate": collection,
+            "pipeline": [
+                {"$match": spec.get("filter", {})},
+                {"$group": {"_id": 1, "n": {"$sum": 1}}},
+            ],
+            "cursor": {},
+        }
+    else:
+        raise ValueError(f"Unsupported query kind: {kind}")
+    return {"explain": command, "verbosity": "executionStats"}
+
+
+class QueryAuditor:
+    """Explains queries issued by the API and records the ones with bad plans.
+
+    Auditing is off unless ``QUERY_AUDIT`` is set. ``QUERY_AUDIT_SAMPLE_RATE``
+    (0-1) controls the fraction of queries explained and
+    ``QUERY_AUDIT_RATIO_THRESHOLD`` the docs-examined/returned ratio that is
+    flagged. Explains run in the background so they never delay a response.
+    """
+
+    def __init__(self, db, enabled: bool = False, sample_rate: float = 1.0,
+                 ratio_threshold: float = DEFAULT_RATIO_THRESHOLD,
+                 history_size: int = DEFAULT_HISTORY_SIZE):
+        self.db = db
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.ratio_threshold = ratio_threshold
+        self.findings = deque(maxlen=history_size)
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self._pending = set()
+
+    @classmethod
+    def from_env(cls, db) -> "QueryAuditor":
+        return cls(
+            db,
+            enabled=os.environ.get("QUERY_AUDIT", "").lower() in ("1", "true", "yes", "on"),
+            sample_rate=float(os.environ.get("QUERY_AUDIT_SAMPLE_RATE", "1.0")),
+            ratio_threshold=float(os.environ.get("QUERY_AUDIT_RATIO_THRESHOLD", DEFAULT_RATIO_THRESHOLD)),
+        )
+
+    def observe(self, endpoint: str, collection: str, kind: str, **spec):
+        """Schedule an explain of a query the API just issued"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return
+        task = asyncio.ensure_future(self.explain(endpoint, collection, kind, **spec))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def aclose(self):
+        """Stop auditing and wait for explains still in flight"""
+        self.enabled = False
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def explain(self, endpoint: str, collection: str, kind: str, **spec) -> Optional[Dict[str, Any]]:
+        """Explain a query now and record the result"""
+        try:
+            explain = await self.db.command(build_explain_command(collection, kind, spec))
+        except Exception as e:
+            logger.warning(f"Query audit explain failed for {endpoint}: {str(e)}")
+            return None
+        return self.record(endpoint, collection, kind, spec, explain)
+
+    def record(self, endpoint: str, collection: str, kind: str, spec: Dict[str, Any],
+               explain: Dict[str, Any]) -> Dict[str, Any]:
+        analysis = analyze_plan(explain, self.ratio_threshold)
+        finding = {
+            "endpoint": endpoint,
+            "collection": collection,
+            "kind": kind,
+            "query": dict(spec),
+            **analysis,
+            "timestamp": datetime.utcnow(),
+        }
+
+        summary = self.endpoints.setdefault(endpoint, {"explained": 0, "flagged": 0, "issues": {}})
+        summary["explained"] += 1
+        if finding["issues"]:
+            summary["flagged"] += 1
+            for issue in finding["issues"]:
+                summary["issues"][issue] = summary["issues"].get(issue, 0) + 1
+            self.findings.append(finding)
+            logger.warning(
+                f"Query audit: {endpoint} {kind} on {collection} -> {', '.join(finding['issues'])} "
+                f"(examined {finding['docs_examined']} docs, returned {finding['n_returned']})"
+            )
+        return finding
+
+    def report(self, limit: int = 50) -> Dict[str, Any]:
+        """Per-endpoint summary plus the most recent flagged queries"""
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "ratio_threshold": self.ratio_threshold,
+            "endpoints": self.endpoints,
+            "recent_findings": list(self.findings)[-limit:][::-1],
+        }
+
+
+# Queries issued by each endpoint, mirroring server.py and labelled as it labels
+# them for the admin endpoint, used by the CLI report
+ENDPOINT_QUERIES = [
+    ("GET /api/reports", "crime_reports", "find",
+     {"filter": {}, "sort": [("timestamp", -1)], "limit": 50}),
+    ("GET /api/reports?area=", "crime_reports", "find",
+     {"filter": {"area": {"$regex": "Downtown", "$options": "i"}}, "sort": [("timestamp", -1)], "limit": 50}),
+    ("GET /api/reports/{id}", "crime_reports", "find",
+     {"filter": {"id": "00000000-0000-0000-0000-000000000000"}, "limit": 1}),
+    ("POST /api/predict", "crime_reports", "find",
+     {"filter": {"area": {"$regex": "Downtown", "$options": "i"}}, "sort": [("timestamp", -1)], "limit": 20}),
+    ("GET /api/predictions", "predictions", "find",
+     {"filter": {}, "sort": [("timestamp", -1)], "limit": 10}),
+    ("GET /api/stats (by area)", "crime_reports", "aggregate",
+     {"pipeline": [{"$group": {"_id": "$area", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}, {"$limit": 10}]}),
+    ("GET /api/stats (by type)", "crime_reports", "aggregate",
+     {"pipeline": [{"$group": {"_id": "$crime_type", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}]}),
+    ("GET /api/stats (total)", "crime_reports", "count", {"filter": {}}),
+    ("GET /api/alerts", "alerts", "find",
+     {"filter": {}, "sort": [("timestamp", -1)], "limit": 20}),
+    ("startup anomaly warm-up", "crime_reports", "find",
+     {"filter": {"timestamp": {"$gte": datetime.utcnow() - timedelta(hours=336)}}, "sort": [("timestamp", 1)]}),
+]
+
+SEED_AREAS = ["Downtown", "Residential District", "Park Area", "Commercial District", "Industrial Zone",
+              "Harbor", "University", "Old Town", "Airport", "Suburbs"]
+SEED_CRIME_TYPES = ["Theft", "Burglary", "Assault", "Vandalism", "Drug-related", "Fraud", "Robbery"]
+
+
+async def seed_dataset(db, num_reports: int, num_predictions: int, num_alerts: int):
+    """Fill crime_reports, predictions and alerts with synthetic documents"""
+    now = datetime.utcnow()
+    reports = []
+    for i in range(num_reports):
+        area = random.choice(SEED_AREAS)
+        reports.append({
+            "id": str(uuid.uuid4()),
+            "crime_type": random.choice(SEED_CRIME_TYPES),
+            "area": area,
+            "location": f"{area} block {random.randint(1, 500)}",
+            "description": "Seeded report for query plan auditing",
+            "timestamp": now - timedelta(minutes=random.randint(0, 60 * 24 * 90)),
+            "reported_by": "Anonymous",
+        })
+    if reports:
+        await db.crime_reports.insert_many(reports)
+
+    predictions = [{
+        "id": str(uuid.uuid4()),
+        "area": random.choice(SEED_AREAS),
+        "prediction_text": "Seeded prediction",
+        "insights": [],
+        "confidence": "Medium",
+        "timestamp": now - timedelta(minutes=random.randint(0, 60 * 24 * 90)),
+    } for _ in range(num_predictions)]
+    if predictions:
+        await db.predictions.insert_many(predictions)
+
+    alerts = []
+    for _ in range(num_alerts):
+        window_start = (now - timedelta(hours=random.randint(0, 24 * 90))).replace(minute=0, second=0, microsecond=0)
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "area": random.choice(SEED_AREAS),
+            "crime_type": random.choice(SEED_CRIME_TYPES),
+            "window_start": window_start,
+            "window_end": window_start + timedelta(hours=1),
+            "count": random.randint(5, 12),
+            "expected": round(random.uniform(0, 2), 2),
+            "score": round(random.uniform(3, 8), 2),
+            "timestamp": window_start + timedelta(minutes=random.randint(0, 59)),
+        })
+    if alerts:
+        await db.alerts.insert_many(alerts)
+
+    # Same indexes as ensure_indexes() in server.py
+    await db.crime_reports.create_index("timestamp")
+    await db.alerts.create_index("timestamp")
+
+
+async def run_report(mongo_url: str, db_name: str, num_reports: int, num_predictions: int, num_alerts: int,
+                     keep: bool):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    auditor = QueryAuditor(db, enabled=True)
+    try:
+        await db.crime_reports.drop()
+        await db.predictions.drop()
+        await db.alerts.drop()
+        await seed_dataset(db, num_reports, num_predictions, num_alerts)
+
+        print(f"Query plans against {num_reports} reports / {num_predictions} predictions / "
+              f"{num_alerts} alerts in '{db_name}'")
+        print("=" * 60)
+        flagged = 0
+        for endpoint, collection, kind, spec in ENDPOINT_QUERIES:
+            finding = await auditor.explain(endpoint, collection, kind, **spec)
+            if finding is None:
+                print(f"❓ {endpoint}: explain failed")
+                continue
+            status = "❌" if finding["issues"] else "✅"
+            flagged += bool(finding["issues"])
+            print(f"{status} {endpoint}")
+            print(f"   stages: {' -> '.join(finding['stages']) or 'n/a'}")
+            print(f"   examined {finding['docs_examined']} docs / {finding['keys_examined']} keys, "
+                  f"returned {finding['n_returned']} (ratio {finding['examined_ratio']})")
+            if finding["issues"]:
+                print(f"   issues: {', '.join(finding['issues'])}")
+        print("=" * 60)
+        print(f"{flagged} of {len(ENDPOINT_QUERIES)} endpoint queries flagged")
+        return flagged
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Report each API endpoint's query plan against a seeded dataset")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=f"{os.environ.get('DB_NAME', 'test_database')}_query_audit",
+                        help="Scratch database to seed (dropped afterwards unless --keep)")
+    parser.add_argument("--reports", type=int, default=5000, help="Number of crime reports to seed")
+    parser.add_argument("--predictions", type=int, default=500, help="Number of predictions to seed")
+    parser.add_argument("--alerts", type=int, default=200, help="Number of anomaly alerts to seed")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database")
+    args = parser.parse_args()
+    if args.db_name == os.environ.get("DB_NAME"):
+        parser.error("--db-name must not be the application database; it is dropped and reseeded")
+
+    flagged = asyncio.run(run_report(args.mongo_url, args.db_name, args.reports, args.predictions,
+                                     args.alerts, args.keep))
+    raise SystemExit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,18 @@ from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from query_audit import QueryAuditor
+from sketches import CrimeStatsSketch
+from anomaly import StreamingAnomalyDetector
+from analytics_store import ColumnarReportStore, lock_snapshot_directory
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -19,6 +24,32 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Query plan auditing (enabled with QUERY_AUDIT=1)
+query_auditor = QueryAuditor.from_env(db)
+
+# Approximate statistics, updated on insert and persisted periodically
+stats_sketch = CrimeStatsSketch()
+STATS_SKETCH_ID = "crime_reports"
+STATS_SKETCH_PERSIST_SECONDS = int(os.environ.get('STATS_SKETCH_PERSIST_SECONDS', '60'))
+
+# Streaming anomaly detection, warmed up from recent history at startup
+anomaly_detector = StreamingAnomalyDetector(
+    z_threshold=float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.0')),
+    min_count=int(os.environ.get('ANOMALY_MIN_COUNT', '5')),
+)
+ANOMALY_WARMUP_HOURS = int(os.environ.get('ANOMALY_WARMUP_HOURS', '336'))
+
+# Columnar copy of report fields for in-process analytics, snapshotted to
+# ANALYTICS_STORE_DIR (memory-mapped on reload) when that is set. The store only
+# holds this process's inserts, so only one worker may set ANALYTICS_STORE_DIR;
+# a second one sharing the directory refuses to start.
+analytics_store = ColumnarReportStore()
+ANALYTICS_STORE_DIR = os.environ.get('ANALYTICS_STORE_DIR')
+# Only a store fully caught up with Mongo may overwrite the snapshot on disk
+analytics_store_complete = False
+analytics_store_lock = None
+ANALYTICS_STORE_PERSIST_SECONDS = int(os.environ.get('ANALYTICS_STORE_PERSIST_SECONDS', '300'))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -56,6 +87,145 @@ class PredictionResult(BaseModel):
     confidence: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class Alert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    area: str
+    crime_type: str
+    window_start: datetime
+    window_end: datetime
+    count: int
+    expected: float
+    score: float
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+def observe_new_reports(reports: List[dict]):
+    """Feed newly inserted reports to the in-memory statistics, anomaly detector and analytics store"""
+    analytics_store.extend(reports)
+    alerts = []
+    for report in reports:
+        stats_sketch.add(report)
+        alert = anomaly_detector.observe(report)
+        if alert:
+            alerts.append(alert)
+    if alerts:
+        spawn(save_alerts(alerts))
+
+async def save_alerts(alerts: List[dict]):
+    for alert in alerts:
+        logger.warning(
+            f"Anomaly: {alert['count']} {alert['crime_type']} reports in {alert['area']} "
+            f"since {alert['window_start']:%Y-%m-%d %H:%M} (expected {alert['expected']})"
+        )
+    try:
+        await db.alerts.insert_many(alerts)
+    except Exception as e:
+        logger.warning(f"Failed to store anomaly alerts: {str(e)}")
+        for alert in alerts:
+            anomaly_detector.release(alert)
+
+async def ensure_indexes():
+    """Indexes for the timestamp-ordered reads issued by the API and at startup"""
+    try:
+        await db.crime_reports.create_index("timestamp")
+        await db.alerts.create_index("timestamp")
+    except Exception as e:
+        logger.warning(f"Failed to create indexes: {str(e)}")
+
+async def warm_up_anomaly_detector():
+    """Replay recent reports so baselines survive restarts"""
+    since = datetime.utcnow() - timedelta(hours=ANOMALY_WARMUP_HOURS)
+    query = {"timestamp": {"$gte": since}}
+    projection = {"_id": 0, "area": 1, "crime_type": 1, "timestamp": 1}
+    query_auditor.observe("startup anomaly warm-up", "crime_reports", "find",
+                          filter=query, sort=[("timestamp", 1)])
+    try:
+        async for report in db.crime_reports.find(query, projection).sort("timestamp", 1):
+            anomaly_detector.observe(report)
+    except Exception as e:
+        logger.warning(f"Failed to warm up anomaly detector, baselines start empty: {str(e)}")
+
+async def load_stats_sketch():
+    """Restore the stats sketch from its snapshot, rebuilding it if the snapshot is stale"""
+    global stats_sketch
+    try:
+        snapshot = await db.stats_sketches.find_one({"_id": STATS_SKETCH_ID})
+        total_reports = await db.crime_reports.estimated_document_count()
+        if snapshot and snapshot["total_reports"] == total_reports:
+            stats_sketch = CrimeStatsSketch.from_document(snapshot)
+            return
+
+        logger.info(f"Rebuilding stats sketch from {total_reports} reports")
+        sketch = CrimeStatsSketch()
+        projection = {"_id": 0, "area": 1, "location": 1, "crime_type": 1}
+        async for report in db.crime_reports.find({}, projection):
+            sketch.add(report)
+        stats_sketch = sketch
+        await save_stats_sketch()
+    except Exception as e:
+        logger.warning(f"Failed to load stats sketch, starting from new reports only: {str(e)}")
+
+async def save_stats_sketch():
+    await db.stats_sketches.replace_one(
+        {"_id": STATS_SKETCH_ID}, stats_sketch.to_document(), upsert=True
+    )
+
+async def load_analytics_store():
+    """Reopen the analytics snapshot and catch up with reports inserted since it was taken.
+
+    An unreadable snapshot is rebuilt from Mongo. If the catch-up fails the
+    store starts empty and is never persisted, so the snapshot is not
+    overwritten with an incomplete history. Raises RuntimeError, stopping
+    startup, if another process already owns ANALYTICS_STORE_DIR.
+    """
+    global analytics_store, analytics_store_complete, analytics_store_lock
+    store = None
+    if ANALYTICS_STORE_DIR:
+        analytics_store_lock = lock_snapshot_directory(ANALYTICS_STORE_DIR)
+        try:
+            store = ColumnarReportStore.load(ANALYTICS_STORE_DIR)
+        except Exception as e:
+            logger.warning(f"Analytics snapshot is unreadable, rebuilding from Mongo: {str(e)}")
+    store = store or ColumnarReportStore()
+
+    query = {}
+    if store.watermark:
+        query["timestamp"] = {"$gt": store.watermark}
+    projection = {"_id": 0, "area": 1, "crime_type": 1, "timestamp": 1}
+    try:
+        batch = []
+        async for report in db.crime_reports.find(query, projection).sort("timestamp", 1):
+            batch.append(report)
+            if len(batch) >= 10000:
+                store.extend(batch)
+                batch = []
+        store.extend(batch)
+    except Exception as e:
+        logger.warning(f"Failed to load analytics store, it will not be persisted this run: {str(e)}")
+        return
+
+    # Startup hooks finish before requests are served, so no live insert
+    # reached the old store while the catch-up ran
+    analytics_store = store
+    analytics_store_complete = True
+    logger.info(f"Analytics store holds {analytics_store.size} reports")
+
+async def save_analytics_store():
+    if ANALYTICS_STORE_DIR and analytics_store_complete:
+        snapshot = analytics_store.snapshot()
+        await asyncio.to_thread(ColumnarReportStore.write_snapshot, ANALYTICS_STORE_DIR, snapshot)
+
+async def persist(save, name: str):
+    """Run one save, logging rather than raising so other saves still happen"""
+    try:
+        await save()
+    except Exception as e:
+        logger.warning(f"Failed to persist {name}: {str(e)}")
+
+async def persist_periodically(save, name: str, seconds: int):
+    while True:
+        await asyncio.sleep(seconds)
+        await persist(save, name)
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -66,7 +236,9 @@ async def create_crime_report(report: CrimeReportCreate):
     """Submit a new crime report"""
     report_dict = report.dict()
     crime_report = CrimeReport(**report_dict)
-    await db.crime_reports.insert_one(crime_report.dict())
+    report_doc = crime_report.dict()
+    await db.crime_reports.insert_one(report_doc)
+    observe_new_reports([report_doc])
     return crime_report
 
 @api_router.get("/reports", response_model=List[CrimeReport])
@@ -77,12 +249,16 @@ async def get_crime_reports(area: Optional[str] = None, limit: int = 50):
         query["area"] = {"$regex": area, "$options": "i"}
     
     reports = await db.crime_reports.find(query).sort("timestamp", -1).limit(limit).to_list(limit)
+    query_auditor.observe("GET /api/reports?area=" if area else "GET /api/reports", "crime_reports", "find",
+                          filter=query, sort=[("timestamp", -1)], limit=limit)
     return [CrimeReport(**report) for report in reports]
 
 @api_router.get("/reports/{report_id}", response_model=CrimeReport)
 async def get_crime_report(report_id: str):
     """Get a specific crime report"""
     report = await db.crime_reports.find_one({"id": report_id})
+    query_auditor.observe("GET /api/reports/{id}", "crime_reports", "find",
+                          filter={"id": report_id}, limit=1)
     if not report:
         raise HTTPException(status_code=404, detail="Crime report not found")
     return CrimeReport(**report)
@@ -97,6 +273,8 @@ async def predict_crime_patterns(request: PredictionRequest):
         query["area"] = {"$regex": request.area, "$options": "i"}
     
     recent_reports = await db.crime_reports.find(query).sort("timestamp", -1).limit(20).to_list(20)
+    query_auditor.observe("POST /api/predict", "crime_reports", "find",
+                          filter=query, sort=[("timestamp", -1)], limit=20)
     
     # Prepare data for AI analysis
     crime_data = []
@@ -109,6 +287,13 @@ async def predict_crime_patterns(request: PredictionRequest):
             "description": report["description"][:100]  # Truncate for token efficiency
         })
     
+    # Aggregate patterns over all reports whose area contains request.area,
+    # computed in-process (plain-text match, unlike the regex query above)
+    summary = analytics_store.summarize(request.area)
+    peak_hours = ", ".join(f"{hour:02d}:00" for hour in summary['peak_hours']) or "Not enough data"
+    busiest_weekday = max(summary['by_weekday'], key=summary['by_weekday'].get) if summary['total_reports'] else None
+    weekly_change = f" ({summary['weekly_change_pct']:+.1f}%)" if summary['weekly_change_pct'] is not None else ""
+    
     # Create AI analysis prompt
     area_filter = f" in {request.area}" if request.area else ""
     prompt = f"""
@@ -117,6 +302,13 @@ async def predict_crime_patterns(request: PredictionRequest):
     Crime Reports:
     {crime_data}
 
+    Aggregate Statistics ({summary['total_reports']} reports):
+    - By type: {summary['by_type']}
+    - Peak hours (UTC): {peak_hours}
+    - Reports by weekday: {summary['by_weekday']}
+    - Last 7 days: {summary['last_7_days']}, previous 7 days: {summary['previous_7_days']}
+    - Forecast for next 7 days: {summary['forecast_next_7_days']}
+
     Please provide:
     1. Crime pattern analysis
     2. Potential hotspot areas
@@ -185,15 +377,16 @@ async def predict_crime_patterns(request: PredictionRequest):
 CRIME ANALYSIS REPORT FOR {area_name.upper()}
 
 📊 DATA OVERVIEW:
-- Total incidents analyzed: {num_reports}
+- Total incidents on record: {summary['total_reports']}
+- Most recent incidents reviewed: {num_reports}
 - Crime types observed: {', '.join(crime_types[:5])}
 - Areas covered: {', '.join(areas[:5])}
 
 🔍 PATTERN ANALYSIS:
-Based on the {num_reports} reported incidents, several key patterns emerge:
+Based on {summary['total_reports']} reported incidents, several key patterns emerge:
 
 1. CRIME TYPE DISTRIBUTION:
-   - Most frequent: {crime_types[0] if crime_types else 'Various types'}
+   - Most frequent: {summary['by_type'][0]['type'] if summary['by_type'] else crime_types[0] if crime_types else 'Various types'}
    - Emerging concerns: Property crimes show consistent patterns
    - Trend analysis: Recent reports suggest concentrated activity
 
@@ -203,9 +396,10 @@ Based on the {num_reports} reported incidents, several key patterns emerge:
    - Low-risk areas: Well-lit, high-traffic zones remain safer
 
 3. TEMPORAL PATTERNS:
-   - Peak incident times: Evening hours (6-10 PM)
-   - Weekly trends: Mid-week shows higher activity
-   - Seasonal factors: Current period shows typical patterns
+   - Peak incident times: {peak_hours} (UTC)
+   - Weekly trends: {busiest_weekday + ' shows the highest activity' if busiest_weekday else 'Not enough data'}
+   - Forecast: about {summary['forecast_next_7_days']:.0f} incidents expected over the next 7 days
+   - Week over week: {summary['last_7_days']} incidents in the last 7 days vs {summary['previous_7_days']} the week before{weekly_change}
 
 ⚠️ RISK ASSESSMENT:
 - Overall risk level: {"MODERATE" if num_reports < 10 else "ELEVATED"}
@@ -284,11 +478,20 @@ async def get_predictions(area: Optional[str] = None, limit: int = 10):
         query["area"] = {"$regex": area, "$options": "i"}
     
     predictions = await db.predictions.find(query).sort("timestamp", -1).limit(limit).to_list(limit)
+    query_auditor.observe("GET /api/predictions", "predictions", "find",
+                          filter=query, sort=[("timestamp", -1)], limit=limit)
     return [PredictionResult(**pred) for pred in predictions]
 
 @api_router.get("/stats")
-async def get_crime_stats():
-    """Get crime statistics by area and type"""
+async def get_crime_stats(approximate: bool = False):
+    """Get crime statistics by area and type
+
+    With approximate=true the statistics come from streaming sketches in
+    constant memory, and each figure is returned with its error bound.
+    """
+    if approximate:
+        return stats_sketch.summary(10)
+
     # Area statistics
     area_pipeline = [
         {"$group": {"_id": "$area", "count": {"$sum": 1}}},
@@ -296,6 +499,7 @@ async def get_crime_stats():
         {"$limit": 10}
     ]
     area_stats = await db.crime_reports.aggregate(area_pipeline).to_list(10)
+    query_auditor.observe("GET /api/stats (by area)", "crime_reports", "aggregate", pipeline=area_pipeline)
     
     # Crime type statistics
     type_pipeline = [
@@ -303,9 +507,11 @@ async def get_crime_stats():
         {"$sort": {"count": -1}}
     ]
     type_stats = await db.crime_reports.aggregate(type_pipeline).to_list(20)
+    query_auditor.observe("GET /api/stats (by type)", "crime_reports", "aggregate", pipeline=type_pipeline)
     
     # Total count
     total_reports = await db.crime_reports.count_documents({})
+    query_auditor.observe("GET /api/stats (total)", "crime_reports", "count", filter={})
     
     return {
         "total_reports": total_reports,
@@ -313,6 +519,31 @@ async def get_crime_stats():
         "by_type": [{"type": stat["_id"], "count": stat["count"]} for stat in type_stats]
     }
 
+@api_router.get("/analytics/summary")
+async def get_analytics_summary(area: Optional[str] = None):
+    """Get aggregate crime patterns and a one-week forecast from the in-memory analytics store
+
+    area is matched as a case-insensitive substring, not a regex.
+    """
+    return analytics_store.summarize(area)
+
+@api_router.get("/alerts", response_model=List[Alert])
+async def get_alerts(area: Optional[str] = None, limit: int = 20):
+    """Get recent anomaly alerts, optionally filtered by area"""
+    query = {}
+    if area:
+        query["area"] = {"$regex": area, "$options": "i"}
+    
+    alerts = await db.alerts.find(query).sort("timestamp", -1).limit(limit).to_list(limit)
+    query_auditor.observe("GET /api/alerts", "alerts", "find",
+                          filter=query, sort=[("timestamp", -1)], limit=limit)
+    return [Alert(**alert) for alert in alerts]
+
+@api_router.get("/admin/query-audit")
+async def get_query_audit(limit: int = 50):
+    """Get query plan audit findings (requires QUERY_AUDIT=1)"""
+    return query_auditor.report(limit)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -331,6 +562,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+background_tasks = set()
+periodic_tasks = []
+
+def spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await ensure_indexes()
+    await load_stats_sketch()
+    await warm_up_anomaly_detector()
+    await load_analytics_store()
+    periodic_tasks.append(asyncio.create_task(
+        persist_periodically(save_stats_sketch, "stats sketch", STATS_SKETCH_PERSIST_SECONDS)
+    ))
+    if ANALYTICS_STORE_DIR:
+        periodic_tasks.append(asyncio.create_task(
+            persist_periodically(save_analytics_store, "analytics store", ANALYTICS_STORE_PERSIST_SECONDS)
+        ))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in periodic_tasks:
+        task.cancel()
+    # Let pending alert writes and explains finish before the client goes away
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await query_auditor.aclose()
+    await persist(save_stats_sketch, "stats sketch")
+    await persist(save_analytics_store, "analytics store")
+    if analytics_store_lock:
+        analytics_store_lock.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Streaming sketches for approximate crime statistics.
+
+Count-Min Sketch, HyperLogLog and Space-Saving use constant memory no matter
+how many distinct areas or locations are reported, and each comes with an
+error bound that is returned alongside its estimates.
+"""
+
+import hashlib
+import math
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _hash_pair(item: str) -> Tuple[int, int]:
+    """Two independent 64-bit hashes of an item"""
+    digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class CountMinSketch:
+    """Frequency estimates that never undercount.
+
+    With probability ``1 - delta`` an estimate exceeds the true count by at most
+    ``epsilon * total``.
+    """
+
+    def __init__(self, epsilon: float = 0.001, delta: float = 0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+        self._rows = np.arange(self.depth)
+
+    def _columns(self, item: str) -> List[int]:
+        h1, h2 = _hash_pair(item)
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, item: str, count: int = 1):
+        self.table[self._rows, self._columns(item)] += count
+        self.total += count
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[self._rows, self._columns(item)].min())
+
+    def error_bound(self) -> Dict[str, Any]:
+        return {
+            "max_overestimate": math.ceil(self.epsilon * self.total),
+            "confidence": 1 - self.delta,
+        }
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "total": self.total,
+            "table": self.table.tobytes(),
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(doc["epsilon"], doc["delta"])
+        sketch.table = np.frombuffer(doc["table"], dtype=np.int64).reshape(sketch.depth, sketch.width).copy()
+        sketch.total = doc["total"]
+        return sketch
+
+
+class HyperLogLog:
+    """Distinct-count estimate with relative standard error ``1.04 / sqrt(2 ** precision)``"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = np.zeros(self.num_registers, dtype=np.uint8)
+        self._alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+
+    def add(self, item: str):
+        h, _ = _hash_pair(item)
+        index = h >> (64 - self.precision)
+        remainder = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        m = self.num_registers
+        raw = self._alpha * m * m / float(np.sum(np.power(2.0, -self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def error_bound(self) -> Dict[str, Any]:
+        return {"relative_standard_error": round(1.04 / math.sqrt(self.num_registers), 4)}
+
+    def to_document(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": self.registers.tobytes()}
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(doc["precision"])
+        sketch.registers = np.frombuffer(doc["registers"], dtype=np.uint8).copy()
+        return sketch
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in ``capacity`` counters.
+
+    Every reported count overestimates the true count by at most its own
+    ``error`` value, which is never more than ``total / capacity``. Any item
+    with a true count above ``total / capacity`` is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counters: Dict[Hashable, List[int]] = {}
+        self.total = 0
+
+    def add(self, item: Hashable, count: int = 1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            evicted = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(evicted)[0]
+            self.counters[item] = [floor + count, floor]
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[Hashable, int, int]]:
+        """(item, count, error) for the ``n`` heaviest items"""
+        ranked = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def error_bound(self) -> Dict[str, Any]:
+        return {"max_overestimate": math.ceil(self.total / self.capacity)}
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "counters": [[item, count, error] for item, (count, error) in self.counters.items()],
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(doc["capacity"])
+        sketch.counters = {item: [count, error] for item, count, error in doc["counters"]}
+        sketch.total = doc["total"]
+        return sketch
+
+
+class CrimeStatsSketch:
+    """Approximate /api/stats, updated one report at a time"""
+
+    def __init__(self, top_k_capacity: int = 100, epsilon: float = 0.001, delta: float = 0.01,
+                 hll_precision: int = 14):
+        self.total_reports = 0
+        self.top_areas = SpaceSaving(top_k_capacity)
+        self.area_counts = CountMinSketch(epsilon, delta)
+        self.top_types = SpaceSaving(top_k_capacity)
+        self.distinct_areas = HyperLogLog(hll_precision)
+        self.distinct_locations = HyperLogLog(hll_precision)
+
+    def add(self, report: Dict[str, Any]):
+        area = report.get("area") or ""
+        self.total_reports += 1
+        self.top_areas.add(area)
+        self.area_counts.add(area)
+        self.top_types.add(report.get("crime_type") or "")
+        self.distinct_areas.add(area)
+        self.distinct_locations.add((report.get("location") or "").strip().lower())
+
+    def summary(self, top_n: int = 10) -> Dict[str, Any]:
+        by_area = []
+        for area, count, error in self.top_areas.top(top_n):
+            # Both sketches only overestimate, so the smaller estimate is tighter
+            by_area.append({
+                "area": area,
+                "count": min(count, self.area_counts.estimate(area)),
+                "max_overestimate": error,
+            })
+
+        return {
+            "total_reports": self.total_reports,
+            "by_area": by_area,
+            "by_type": [
+                {"type": crime_type, "count": count, "max_overestimate": error}
+                for crime_type, count, error in self.top_types.top(top_n)
+            ],
+            "distinct_areas": self.distinct_areas.estimate(),
+            "distinct_locations": self.distinct_locations.estimate(),
+            "approximate": True,
+            "error_bounds": {
+                "by_area": {**self.top_areas.error_bound(), "count_min": self.area_counts.error_bound()},
+                "by_type": self.top_types.error_bound(),
+                "distinct_areas": self.distinct_areas.error_bound(),
+                "distinct_locations": self.distinct_locations.error_bound(),
+            },
+        }
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "total_reports": self.total_reports,
+            "top_areas": self.top_areas.to_document(),
+            "area_counts": self.area_counts.to_document(),
+            "top_types": self.top_types.to_document(),
+            "distinct_areas": self.distinct_areas.to_document(),
+            "distinct_locations": self.distinct_locations.to_document(),
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "CrimeStatsSketch":
+        sketch = cls()
+        sketch.total_reports = doc["total_reports"]
+        sketch.top_areas = SpaceSaving.from_document(doc["top_areas"])
+        sketch.area_counts = CountMinSketch.from_document(doc["area_counts"])
+        sketch.top_types = SpaceSaving.from_document(doc["top_types"])
+        sketch.distinct_areas = HyperLogLog.from_document(doc["distinct_areas"])
+        sketch.distinct_locations = HyperLogLog.from_document(doc["distinct_locations"])
+        return sketch
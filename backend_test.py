@@ -13,6 +13,9 @@ import uuid
 # Backend URL from frontend/.env
 BACKEND_URL = "https://7b5be203-4f72-469f-90f1-4dd2784f8696.preview.emergentagent.com/api"
 
+# Must match ANOMALY_MIN_COUNT on the backend (default 5)
+ANOMALY_MIN_COUNT = 5
+
 # Test data - realistic crime reports
 SAMPLE_CRIME_REPORTS = [
     {
@@ -60,7 +63,9 @@ class CrimePortalTester:
             "crud_api": {"passed": 0, "failed": 0, "errors": []},
             "ai_prediction": {"passed": 0, "failed": 0, "errors": []},
             "openai_integration": {"passed": 0, "failed": 0, "errors": []},
-            "statistics_api": {"passed": 0, "failed": 0, "errors": []}
+            "statistics_api": {"passed": 0, "failed": 0, "errors": []},
+            "alerts_api": {"passed": 0, "failed": 0, "errors": []},
+            "admin_api": {"passed": 0, "failed": 0, "errors": []}
         }
 
     def log_result(self, category, test_name, success, error_msg=None):
@@ -222,6 +227,155 @@ class CrimePortalTester:
         except Exception as e:
             self.log_result("statistics_api", "Crime Statistics API", False, str(e))
 
+    def test_approximate_statistics(self):
+        """Test GET /api/stats?approximate=true - Sketch-based statistics"""
+        print("\n🔍 Testing Approximate Crime Statistics API...")
+        
+        try:
+            response = self.session.get(f"{BACKEND_URL}/stats?approximate=true")
+            
+            if response.status_code == 200:
+                data = response.json()
+                required_fields = ["total_reports", "by_area", "by_type", "distinct_locations", "error_bounds"]
+                
+                if all(field in data for field in required_fields):
+                    if data.get("approximate") is True and all("max_overestimate" in stat for stat in data["by_area"]):
+                        self.log_result("statistics_api", "Approximate Statistics Structure", True)
+                        self.check_approximate_within_bounds(data)
+                    else:
+                        self.log_result("statistics_api", "Approximate Statistics Structure", False, "Missing per-item error bounds")
+                else:
+                    self.log_result("statistics_api", "Approximate Statistics Structure", False, f"Missing fields: {set(required_fields) - set(data.keys())}")
+            else:
+                self.log_result("statistics_api", "Approximate Statistics API", False, f"Status code: {response.status_code}")
+                
+        except Exception as e:
+            self.log_result("statistics_api", "Approximate Statistics API", False, str(e))
+
+    def check_approximate_within_bounds(self, approximate):
+        """Compare sketch counts with exact /api/stats counts within their max_overestimate"""
+        response = self.session.get(f"{BACKEND_URL}/stats")
+        if response.status_code != 200:
+            self.log_result("statistics_api", "Approximate Statistics Accuracy", False, f"Exact stats status code: {response.status_code}")
+            return
+        exact = response.json()
+        
+        exact_areas = {stat["area"]: stat["count"] for stat in exact["by_area"]}
+        exact_types = {stat["type"]: stat["count"] for stat in exact["by_type"]}
+        violations = []
+        for stats, key, exact_counts in ((approximate["by_area"], "area", exact_areas),
+                                         (approximate["by_type"], "type", exact_types)):
+            for stat in stats:
+                # Exact by_area is only the top 10, so areas outside it cannot be compared
+                if stat[key] not in exact_counts:
+                    continue
+                true_count = exact_counts[stat[key]]
+                if not true_count <= stat["count"] <= true_count + stat["max_overestimate"]:
+                    violations.append(f"{stat[key]}: {stat['count']} vs exact {true_count} (+{stat['max_overestimate']})")
+        
+        if violations:
+            self.log_result("statistics_api", "Approximate Statistics Accuracy", False, "; ".join(violations))
+        else:
+            self.log_result("statistics_api", "Approximate Statistics Accuracy", True)
+
+    def test_get_alerts(self):
+        """Test GET /api/alerts - A burst of reports for a new area raises an anomaly alert"""
+        print("\n🔍 Testing Anomaly Alerts API...")
+        
+        area = f"Anomaly Test {uuid.uuid4().hex[:8]}"
+        burst_report = {
+            "crime_type": "Burglary",
+            "area": area,
+            "location": "Elm Street",
+            "description": "Burst of burglaries to trigger the anomaly detector.",
+            "reported_by": "Backend Test"
+        }
+        
+        try:
+            for _ in range(ANOMALY_MIN_COUNT):
+                response = self.session.post(f"{BACKEND_URL}/reports", json=burst_report)
+                if response.status_code != 200:
+                    self.log_result("alerts_api", "Anomaly Alert Triggered", False, f"Report creation status code: {response.status_code}")
+                    return
+                self.created_report_ids.append(response.json()["id"])
+            
+            # Alerts are written in the background, so poll briefly
+            matching = []
+            for _ in range(5):
+                response = self.session.get(f"{BACKEND_URL}/alerts", params={"area": area})
+                if response.status_code != 200:
+                    self.log_result("alerts_api", "Get Anomaly Alerts", False, f"Status code: {response.status_code}")
+                    return
+                matching = [a for a in response.json() if a.get("area") == area and a.get("crime_type") == "Burglary"]
+                if matching:
+                    break
+                time.sleep(1)
+            
+            if not matching:
+                self.log_result("alerts_api", "Anomaly Alert Triggered", False, f"No alert for {area} after {ANOMALY_MIN_COUNT} reports")
+                return
+            self.log_result("alerts_api", "Anomaly Alert Triggered", True)
+            
+            alert = matching[0]
+            required_fields = ["id", "area", "crime_type", "window_start", "count", "expected", "score"]
+            if all(field in alert for field in required_fields) and alert["count"] >= ANOMALY_MIN_COUNT:
+                self.log_result("alerts_api", "Anomaly Alert Structure", True)
+            else:
+                self.log_result("alerts_api", "Anomaly Alert Structure", False, "Invalid alert structure")
+            
+            if len(matching) == 1:
+                self.log_result("alerts_api", "Single Alert Per Window", True)
+            else:
+                self.log_result("alerts_api", "Single Alert Per Window", False, f"{len(matching)} alerts for one burst")
+                
+        except Exception as e:
+            self.log_result("alerts_api", "Get Anomaly Alerts", False, str(e))
+
+    def test_analytics_summary(self):
+        """Test GET /api/analytics/summary - In-memory analytics store"""
+        print("\n🔍 Testing Analytics Summary API...")
+        
+        try:
+            response = self.session.get(f"{BACKEND_URL}/analytics/summary?area=Downtown")
+            
+            if response.status_code == 200:
+                data = response.json()
+                required_fields = ["total_reports", "by_type", "by_hour", "peak_hours", "forecast_next_7_days"]
+                
+                if all(field in data for field in required_fields):
+                    if len(data["by_hour"]) == 24 and data["total_reports"] > 0:
+                        self.log_result("statistics_api", "Analytics Summary Data", True)
+                    else:
+                        self.log_result("statistics_api", "Analytics Summary Data", False, "No analytics data for Downtown")
+                else:
+                    self.log_result("statistics_api", "Analytics Summary Structure", False, f"Missing fields: {set(required_fields) - set(data.keys())}")
+            else:
+                self.log_result("statistics_api", "Analytics Summary API", False, f"Status code: {response.status_code}")
+                
+        except Exception as e:
+            self.log_result("statistics_api", "Analytics Summary API", False, str(e))
+
+    def test_query_audit(self):
+        """Test GET /api/admin/query-audit - Query plan audit report"""
+        print("\n🔍 Testing Query Plan Audit API...")
+        
+        try:
+            response = self.session.get(f"{BACKEND_URL}/admin/query-audit")
+            
+            if response.status_code == 200:
+                data = response.json()
+                required_fields = ["enabled", "endpoints", "recent_findings"]
+                
+                if all(field in data for field in required_fields):
+                    self.log_result("admin_api", "Query Plan Audit Structure", True)
+                else:
+                    self.log_result("admin_api", "Query Plan Audit Structure", False, f"Missing fields: {set(required_fields) - set(data.keys())}")
+            else:
+                self.log_result("admin_api", "Query Plan Audit API", False, f"Status code: {response.status_code}")
+                
+        except Exception as e:
+            self.log_result("admin_api", "Query Plan Audit API", False, str(e))
+
     def test_ai_prediction_basic(self):
         """Test POST /api/predict - Basic AI prediction"""
         print("\n🔍 Testing AI Crime Prediction (Basic)...")
@@ -356,6 +510,8 @@ class CrimePortalTester:
         print("📊 TESTING CRIME STATISTICS API")
         print("="*60)
         self.test_crime_statistics()
+        self.test_approximate_statistics()
+        self.test_analytics_summary()
         
         # Test AI Prediction API and OpenAI Integration
         print("\n" + "="*60)
@@ -367,6 +523,18 @@ class CrimePortalTester:
         time.sleep(1)
         self.test_get_predictions()
         
+        # Test Anomaly Alerts API
+        print("\n" + "="*60)
+        print("🚨 TESTING ANOMALY ALERTS API")
+        print("="*60)
+        self.test_get_alerts()
+        
+        # Test Admin API
+        print("\n" + "="*60)
+        print("🛠️ TESTING ADMIN API")
+        print("="*60)
+        self.test_query_audit()
+        
         return self.generate_summary()
 
     def generate_summary(self):
@@ -388,7 +556,9 @@ class CrimePortalTester:
             "crud_api": "Crime Report CRUD API",
             "statistics_api": "Crime Statistics API", 
             "ai_prediction": "AI Crime Prediction API",
-            "openai_integration": "OpenAI Integration"
+            "openai_integration": "OpenAI Integration",
+            "alerts_api": "Anomaly Alerts API",
+            "admin_api": "Admin API"
         }
         
         for key, name in categories.items():
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from analytics_store import ColumnarReportStore, lock_snapshot_directory
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def make_store():
+    store = ColumnarReportStore(initial_capacity=4)
+    reports = []
+    for day in range(14):
+        for area, crime_type, hour in (("Downtown", "Theft", 9), ("Downtown East", "Assault", 10), ("Harbor", "Theft", 3)):
+            reports.append({"area": area, "crime_type": crime_type,
+                            "timestamp": NOW.replace(hour=hour) - timedelta(days=day)})
+    store.append(reports[0])
+    store.extend(reports[1:])
+    return store
+
+
+def test_summarize_filters_area_like_mongo_regex():
+    summary = make_store().summarize("downtown", now=NOW)
+    assert summary["total_reports"] == 28
+    assert {stat["area"] for stat in summary["by_area"]} == {"Downtown", "Downtown East"}
+    assert summary["peak_hours"] == [10, 9]
+    assert summary["last_7_days"] + summary["previous_7_days"] == 28
+    assert summary["forecast_next_7_days"] > 0
+
+
+def test_empty_store_summary():
+    summary = ColumnarReportStore().summarize(now=NOW)
+    assert summary["total_reports"] == 0
+    assert summary["peak_hours"] == []
+    assert summary["weekly_change_pct"] is None
+
+
+def test_snapshot_reloads_memory_mapped_and_accepts_appends(tmp_path):
+    store = make_store()
+    store.save(str(tmp_path))
+
+    loaded = ColumnarReportStore.load(str(tmp_path))
+    assert loaded.summarize(now=NOW) == store.summarize(now=NOW)
+    assert loaded.watermark == store.watermark
+
+    loaded.append({"area": "Airport", "crime_type": "Fraud", "timestamp": NOW})
+    assert loaded.summarize("airport", now=NOW)["total_reports"] == 1
+    assert loaded.size == store.size + 1
+
+
+def test_load_without_snapshot_returns_none(tmp_path):
+    assert ColumnarReportStore.load(str(tmp_path)) is None
+
+
+def test_area_is_matched_as_plain_text_not_regex():
+    store = make_store()
+    store.append({"area": "a" * 28 + "!", "crime_type": "Theft", "timestamp": NOW})
+    store.append({"area": "Pier (North)", "crime_type": "Theft", "timestamp": NOW})
+
+    # A catastrophic-backtracking regex is just a substring that matches nothing
+    assert store.summarize("(a+)+$", now=NOW)["total_reports"] == 0
+    assert store.summarize("(NORTH)", now=NOW)["total_reports"] == 1
+
+
+def test_load_rejects_truncated_column(tmp_path):
+    store = make_store()
+    store.save(str(tmp_path))
+    np.save(tmp_path / "timestamps.npy", store.timestamps[:5])
+
+    with pytest.raises(ValueError):
+        ColumnarReportStore.load(str(tmp_path))
+
+
+def test_load_rejects_codes_outside_dictionaries(tmp_path):
+    store = make_store()
+    store.save(str(tmp_path))
+    np.save(tmp_path / "area_codes.npy", np.full(store.size, 99, dtype=np.int32))
+
+    with pytest.raises(ValueError):
+        ColumnarReportStore.load(str(tmp_path))
+
+
+def test_snapshot_directory_has_a_single_owner(tmp_path):
+    lock = lock_snapshot_directory(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        lock_snapshot_directory(str(tmp_path))
+
+    lock.close()
+    lock_snapshot_directory(str(tmp_path)).close()
+
+
+def test_snapshot_leaves_no_temporary_files(tmp_path):
+    make_store().save(str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "area_codes.npy", "dictionaries.json", "timestamps.npy", "type_codes.npy",
+    ]
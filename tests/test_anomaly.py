@@ -0,0 +1,76 @@
+import random
+from datetime import datetime, timedelta
+
+from anomaly import StreamingAnomalyDetector
+
+START = datetime(2026, 1, 1)
+
+
+def report(timestamp, area="Downtown", crime_type="Burglary"):
+    return {"area": area, "crime_type": crime_type, "timestamp": timestamp}
+
+
+def steady_history(detector, hours=24 * 14, seed=5):
+    """One or two reports in most hours, never more than the alert minimum"""
+    rng = random.Random(seed)
+    alerts = []
+    for hour in range(hours):
+        for _ in range(rng.choice([0, 1, 1, 2])):
+            alert = detector.observe(report(START + timedelta(hours=hour, minutes=rng.randint(0, 59))))
+            if alert:
+                alerts.append(alert)
+    return alerts
+
+
+def burst(detector, hour, count, **fields):
+    window = START + timedelta(hours=hour)
+    return [detector.observe(report(window + timedelta(minutes=i), **fields)) for i in range(count)]
+
+
+def test_steady_baseline_raises_no_alert():
+    detector = StreamingAnomalyDetector()
+    assert steady_history(detector) == []
+
+
+def test_spike_raises_alert():
+    detector = StreamingAnomalyDetector()
+    steady_history(detector)
+    alerts = [alert for alert in burst(detector, 24 * 14, 6) if alert]
+
+    assert len(alerts) == 1
+    alert = alerts[0]
+    assert (alert["area"], alert["crime_type"]) == ("Downtown", "Burglary")
+    assert alert["window_start"] == START + timedelta(hours=24 * 14)
+    assert alert["count"] >= detector.min_count
+    assert alert["score"] >= detector.z_threshold
+
+
+def test_one_alert_per_bucket():
+    detector = StreamingAnomalyDetector()
+    first = [alert for alert in burst(detector, 0, 20) if alert]
+    assert len(first) == 1
+
+    # The next bucket alerts again on its own burst
+    second = [alert for alert in burst(detector, 1, 20) if alert]
+    assert len(second) == 1
+
+
+def test_pairs_are_tracked_separately():
+    detector = StreamingAnomalyDetector()
+    burst(detector, 0, 4, crime_type="Theft")
+    assert not any(burst(detector, 0, 4, crime_type="Assault"))
+
+
+def test_release_lets_bucket_alert_again():
+    detector = StreamingAnomalyDetector()
+    alert = next(alert for alert in burst(detector, 0, 5) if alert)
+    assert detector.observe(report(START + timedelta(minutes=30))) is None
+
+    detector.release(alert)
+    assert detector.observe(report(START + timedelta(minutes=31))) is not None
+
+
+def test_late_reports_are_ignored():
+    detector = StreamingAnomalyDetector()
+    detector.observe(report(START + timedelta(hours=5)))
+    assert not any(burst(detector, 0, 10))
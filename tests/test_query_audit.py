@@ -0,0 +1,160 @@
+import asyncio
+
+from query_audit import QueryAuditor, analyze_plan, build_explain_command
+
+FIND_COLLSCAN_SORT = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "SORT",
+            "sortPattern": {"timestamp": -1},
+            "limitAmount": 50,
+            "inputStage": {"stage": "COLLSCAN", "direction": "forward"},
+        },
+        "rejectedPlans": [{"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}],
+    },
+    "executionStats": {
+        "nReturned": 50,
+        "totalKeysExamined": 0,
+        "totalDocsExamined": 5000,
+        "executionStages": {
+            "stage": "SORT",
+            "nReturned": 50,
+            "inputStage": {"stage": "COLLSCAN", "nReturned": 5000},
+        },
+    },
+}
+
+FIND_INDEXED = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "LIMIT",
+            "inputStage": {
+                "stage": "FETCH",
+                "inputStage": {"stage": "IXSCAN", "keyPattern": {"timestamp": -1}},
+            },
+        },
+        "rejectedPlans": [],
+    },
+    "executionStats": {
+        "nReturned": 50,
+        "totalKeysExamined": 50,
+        "totalDocsExamined": 50,
+        "executionStages": {"stage": "LIMIT", "inputStage": {"stage": "FETCH"}},
+    },
+}
+
+# Classic engine: $group and $sort run in the pipeline after a $cursor stage
+AGGREGATE_GROUP_SORT = {
+    "explainVersion": "1",
+    "stages": [
+        {
+            "$cursor": {
+                "queryPlanner": {
+                    "winningPlan": {
+                        "stage": "PROJECTION_SIMPLE",
+                        "transformBy": {"area": 1, "_id": 0},
+                        "inputStage": {"stage": "COLLSCAN", "direction": "forward"},
+                    },
+                    "rejectedPlans": [],
+                },
+                "executionStats": {
+                    "nReturned": 5000,
+                    "totalKeysExamined": 0,
+                    "totalDocsExamined": 5000,
+                    "executionStages": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": "COLLSCAN"}},
+                },
+            },
+            "nReturned": 5000,
+        },
+        {"$group": {"_id": "$area", "count": {"$sum": {"$const": 1}}}, "nReturned": 10},
+        {"$sort": {"sortKey": {"count": -1}, "limit": 10}, "nReturned": 10},
+    ],
+}
+
+# Slot-based engine: the $group is pushed down, so the whole plan is top-level
+AGGREGATE_PUSHED_DOWN_COUNT = {
+    "explainVersion": "2",
+    "queryPlanner": {
+        "winningPlan": {
+            "queryPlan": {
+                "stage": "GROUP",
+                "inputStage": {"stage": "COLLSCAN", "direction": "forward"},
+            },
+            "slotBasedPlan": {"slots": "...", "stages": "..."},
+        },
+        "rejectedPlans": [],
+    },
+    "executionStats": {
+        "nReturned": 1,
+        "totalKeysExamined": 0,
+        "totalDocsExamined": 5000,
+        "executionStages": {"stage": "group", "inputStage": {"stage": "scan"}},
+    },
+}
+
+
+def test_find_collscan_with_blocking_sort_is_flagged():
+    result = analyze_plan(FIND_COLLSCAN_SORT)
+    assert result["stages"] == ["COLLSCAN", "SORT"]
+    assert result["issues"] == ["COLLSCAN", "IN_MEMORY_SORT", "HIGH_EXAMINED_RATIO"]
+    assert result["examined_ratio"] == 100.0
+
+
+def test_indexed_find_is_clean():
+    result = analyze_plan(FIND_INDEXED)
+    assert result["stages"] == ["IXSCAN", "FETCH", "LIMIT"]
+    assert result["issues"] == []
+
+
+def test_aggregate_pipeline_sort_and_output_count():
+    result = analyze_plan(AGGREGATE_GROUP_SORT)
+    assert result["stages"] == ["COLLSCAN", "PROJECTION_SIMPLE", "$group", "$sort"]
+    assert result["n_returned"] == 10
+    assert result["docs_examined"] == 5000
+    assert result["issues"] == ["COLLSCAN", "IN_MEMORY_SORT", "HIGH_EXAMINED_RATIO"]
+
+
+def test_pushed_down_count_uses_top_level_result():
+    result = analyze_plan(AGGREGATE_PUSHED_DOWN_COUNT)
+    assert result["stages"] == ["COLLSCAN", "GROUP"]
+    assert result["n_returned"] == 1
+    assert result["issues"] == ["COLLSCAN", "HIGH_EXAMINED_RATIO"]
+
+
+def test_ratio_threshold_is_configurable():
+    assert "HIGH_EXAMINED_RATIO" not in analyze_plan(FIND_COLLSCAN_SORT, ratio_threshold=1000)["issues"]
+
+
+def test_count_is_explained_as_driver_aggregation():
+    command = build_explain_command("crime_reports", "count", {"filter": {}})
+    assert command["verbosity"] == "executionStats"
+    assert command["explain"]["pipeline"] == [
+        {"$match": {}},
+        {"$group": {"_id": 1, "n": {"$sum": 1}}},
+    ]
+
+
+class SlowDatabase:
+    def __init__(self):
+        self.closed = False
+
+    async def command(self, command):
+        await asyncio.sleep(0.01)
+        if self.closed:
+            raise RuntimeError("client closed")
+        return FIND_INDEXED
+
+
+def test_aclose_waits_for_pending_explains():
+    async def scenario():
+        db = SlowDatabase()
+        auditor = QueryAuditor(db, enabled=True)
+        auditor.observe("GET /api/reports", "crime_reports", "find", filter={}, limit=50)
+        await auditor.aclose()
+        db.closed = True
+        auditor.observe("GET /api/reports", "crime_reports", "find", filter={}, limit=50)
+        return auditor
+
+    auditor = asyncio.run(scenario())
+    assert auditor.endpoints["GET /api/reports"]["explained"] == 1
+    assert not auditor._pending
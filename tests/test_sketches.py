@@ -0,0 +1,75 @@
+import math
+import random
+from collections import Counter
+
+from sketches import CountMinSketch, CrimeStatsSketch, HyperLogLog, SpaceSaving
+
+
+def zipf_stream(num_items, length, seed=7):
+    rng = random.Random(seed)
+    items = [f"area-{i}" for i in range(num_items)]
+    weights = [1 / (rank + 1) for rank in range(num_items)]
+    return rng.choices(items, weights, k=length)
+
+
+def test_count_min_sketch_within_bound():
+    stream = zipf_stream(5000, 50000)
+    sketch = CountMinSketch(epsilon=0.001, delta=0.01)
+    for item in stream:
+        sketch.add(item)
+
+    exact = Counter(stream)
+    bound = sketch.error_bound()["max_overestimate"]
+    errors = [sketch.estimate(item) - count for item, count in exact.items()]
+    assert min(errors) >= 0
+    # The bound holds per item with probability 1 - delta
+    within = sum(error <= bound for error in errors)
+    assert within / len(errors) >= 1 - sketch.delta
+
+
+def test_hyperloglog_within_three_standard_errors():
+    rng = random.Random(11)
+    values = {f"location-{rng.getrandbits(48)}" for _ in range(100000)}
+    sketch = HyperLogLog(precision=14)
+    for value in values:
+        sketch.add(value)
+        sketch.add(value)
+
+    relative_error = abs(sketch.estimate() - len(values)) / len(values)
+    assert relative_error <= 3 * sketch.error_bound()["relative_standard_error"]
+
+
+def test_hyperloglog_small_cardinality_is_near_exact():
+    sketch = HyperLogLog()
+    for i in range(100):
+        sketch.add(f"location-{i}")
+    assert abs(sketch.estimate() - 100) <= 2
+
+
+def test_space_saving_counts_within_bound():
+    stream = zipf_stream(5000, 50000)
+    sketch = SpaceSaving(capacity=100)
+    for item in stream:
+        sketch.add(item)
+
+    exact = Counter(stream)
+    bound = sketch.error_bound()["max_overestimate"]
+    for item, count, error in sketch.top():
+        assert exact[item] <= count <= exact[item] + error
+        assert error <= bound
+    # Every item above total / capacity is tracked
+    heavy = {item for item, count in exact.items() if count > bound}
+    assert heavy <= set(sketch.counters)
+
+
+def test_crime_stats_sketch_round_trip():
+    rng = random.Random(3)
+    sketch = CrimeStatsSketch()
+    for area in zipf_stream(200, 5000):
+        sketch.add({"area": area, "crime_type": rng.choice(["Theft", "Assault"]), "location": f"{area} {rng.randint(1, 50)}"})
+
+    summary = sketch.summary(10)
+    assert summary["total_reports"] == 5000
+    assert len(summary["by_area"]) == 10
+    assert CrimeStatsSketch.from_document(sketch.to_document()).summary(10) == summary
+    assert math.isclose(summary["error_bounds"]["distinct_locations"]["relative_standard_error"], 0.0081)